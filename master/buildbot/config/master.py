@@ -45,6 +45,9 @@ from buildbot.www.authz import authz
 
 DEFAULT_DB_URL = 'sqlite:///state.sqlite'
 
+# keys of c['db'] that are passed to the SQLAlchemy engine to size its connection pool
+DB_POOL_KEYS = ('pool_size', 'max_overflow', 'pool_pre_ping', 'pool_recycle')
+
 _in_unit_tests = False
 
 
@@ -161,7 +164,7 @@ class MasterConfig(util.ComparableMixin):
         self.db = {"db_url": DEFAULT_DB_URL}
         self.mq = {"type": 'simple'}
         self.metrics = None
-        self.caches = {"Builds": 15, "Changes": 10}
+        self.caches = {"Builds": 15, "Changes": 10, "build_data": 1000}
         self.schedulers = {}
         self.secretsProviders = []
         self.builders = []
@@ -454,7 +457,7 @@ class MasterConfig(util.ComparableMixin):
     def getDbUrlFromConfig(config_dict, throwErrors=True):
         if 'db' in config_dict:
             db = config_dict['db']
-            if set(db.keys()) - set(['db_url']) and throwErrors:
+            if set(db.keys()) - set(['db_url', *DB_POOL_KEYS]) and throwErrors:
                 error("unrecognized keys in c['db']")
 
             config_dict = db
@@ -469,6 +472,23 @@ class MasterConfig(util.ComparableMixin):
     def load_db(self, filename, config_dict):
         self.db = {"db_url": self.getDbUrlFromConfig(config_dict)}
 
+        db = config_dict.get('db', {})
+        for key in DB_POOL_KEYS:
+            if key not in db:
+                continue
+            value = db[key]
+            if key == 'pool_pre_ping':
+                if not isinstance(value, bool):
+                    error(f"c['db']['{key}'] must be a boolean")
+                    continue
+            elif not isinstance(value, int) or isinstance(value, bool):
+                error(f"c['db']['{key}'] must be an integer")
+                continue
+            elif key == 'pool_size' and value < 1:
+                error(f"c['db']['{key}'] must be at least 1")
+                continue
+            self.db[key] = value
+
     def load_mq(self, filename, config_dict):
         from buildbot.mq import connector  # avoid circular imports
 
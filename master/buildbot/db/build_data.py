@@ -16,9 +16,15 @@
 
 from __future__ import annotations
 
+import collections
+from contextlib import closing
 from dataclasses import dataclass
+from dataclasses import fields
 
 import sqlalchemy as sa
+import sqlalchemy.dialects.mysql
+import sqlalchemy.dialects.postgresql
+import sqlalchemy.dialects.sqlite
 from twisted.internet import defer
 from twisted.python import deprecate
 from twisted.python import versions
@@ -28,24 +34,42 @@ from buildbot.db import base
 from buildbot.warnings import warn_deprecated
 
 
-@dataclass
+# slots are declared by hand as dataclass(slots=True) requires Python 3.10
+@dataclass(frozen=True)
 class BuildDataModel:
+    __slots__ = ('buildid', 'name', 'length', 'source', 'value')
+
     buildid: int
     name: str
     length: int
     source: str
     value: bytes | None
 
+    # the deprecation warning below does not depend on the key, so it is only emitted once to keep
+    # legacy code that reads many values from paying the cost of the warnings machinery each time
+    _deprecation_warned = False
+
+    # copy and pickle restore slots with setattr, which the frozen dataclass forbids. These are
+    # the methods that dataclass(slots=True) would add.
+    def __getstate__(self):
+        return [getattr(self, f.name) for f in fields(self)]
+
+    def __setstate__(self, state):
+        for f, value in zip(fields(self), state):
+            object.__setattr__(self, f.name, value)
+
     # For backward compatibility
     def __getitem__(self, key: str):
-        warn_deprecated(
-            '4.1.0',
-            (
-                'BuildDataConnectorComponent getBuildData, getBuildDataNoValue, and getAllBuildDataNoValues '
-                'no longer return BuildData as dictionnaries. '
-                'Usage of [] accessor is deprecated: please access the member directly'
-            ),
-        )
+        if not BuildDataModel._deprecation_warned:
+            BuildDataModel._deprecation_warned = True
+            warn_deprecated(
+                '4.1.0',
+                (
+                    'BuildDataConnectorComponent getBuildData, getBuildDataNoValue, and '
+                    'getAllBuildDataNoValues no longer return BuildData as dictionnaries. '
+                    'Usage of [] accessor is deprecated: please access the member directly'
+                ),
+            )
 
         if hasattr(self, key):
             return getattr(self, key)
@@ -55,40 +79,172 @@ class BuildDataModel:
 
 @deprecate.deprecated(versions.Version("buildbot", 4, 1, 0), BuildDataModel)
 class BuildDataDict(BuildDataModel):
-    pass
+    __slots__ = ()
 
 
 class BuildDataConnectorComponent(base.DBConnectorComponent):
+    _FETCH_BATCH_SIZE = 1000
+    _DELETE_BATCH_SIZE = 10000
+    _SKIP_UNCHANGED_MIN_LENGTH = 64 * 1024
+
+    _select_stmts = None
+    _insert_stmts = None
+    _is_sqlite_cached = None
+
+    def __init__(self, connector):
+        super().__init__(connector)
+        # LRU cache of getBuildDataNoValue results, keyed by (buildid, name). The generation is
+        # bumped on every write so that a read that raced with a write is not cached. It is only
+        # used with sqlite, as other masters sharing the database do not invalidate it.
+        self._no_value_cache = collections.OrderedDict()
+        self._no_value_cache_generation = 0
+
+    def _no_value_cache_size(self):
+        # the size is looked up on each use so that it follows reconfigs of c['caches']
+        if not self._is_sqlite():
+            return 0
+        return self.master.config.caches['build_data']
+
     def _insert_race_hook(self, conn):
         # called so tests can simulate a race condition during insertion
         pass
 
+    def _is_sqlite(self):
+        # the engine is not available yet when the component is created, so the dialect is looked
+        # up on first use. This is not a property as DBConnectorComponent.__init__ would evaluate it
+        if self._is_sqlite_cached is None:
+            self._is_sqlite_cached = self.db._engine.dialect.name == 'sqlite'
+        return self._is_sqlite_cached
+
+    def _get_select_stmts(self):
+        # the read queries only differ by their parameters, so they are built once; SQLAlchemy
+        # then finds their compiled form in its statement cache instead of rebuilding it per call
+        if self._select_stmts is not None:
+            return self._select_stmts
+
+        build_data_table = self.db.model.build_data
+        no_value_columns = (
+            build_data_table.c.buildid,
+            build_data_table.c.name,
+            build_data_table.c.length,
+            build_data_table.c.source,
+        )
+        by_buildid = build_data_table.c.buildid == sa.bindparam('buildid')
+        by_buildid_and_name = by_buildid & (build_data_table.c.name == sa.bindparam('name'))
+
+        self._select_stmts = {
+            'with_value': build_data_table.select().where(by_buildid_and_name),
+            'no_value': sa.select(*no_value_columns).where(by_buildid_and_name),
+            'all_no_values': sa.select(*no_value_columns).where(by_buildid),
+            # returns a row only if the stored value equals the given one
+            'same_value': sa.select(sa.literal_column('1')).where(
+                by_buildid_and_name & (build_data_table.c.value == sa.bindparam('value'))
+            ),
+        }
+        return self._select_stmts
+
+    def _get_insert_stmts(self, dialect):
+        # the insert statements only depend on the dialect, so they are built once and reused with
+        # different parameters. Returns a dict with an 'upsert' statement that replaces existing
+        # data and an 'insert_ignore' statement that keeps it, or None on dialects without native
+        # upsert support.
+        if self._insert_stmts is not None:
+            return self._insert_stmts
+
+        build_data_table = self.db.model.build_data
+        index_elements = [build_data_table.c.buildid, build_data_table.c.name]
+
+        if dialect.name == 'postgresql' or (
+            dialect.name == 'sqlite' and dialect.server_version_info >= (3, 24, 0)
+        ):
+            if dialect.name == 'postgresql':
+                insert = sa.dialects.postgresql.insert
+            else:
+                insert = sa.dialects.sqlite.insert
+            q = insert(build_data_table)
+            upsert_q = q.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={
+                    'value': q.excluded.value,
+                    'length': q.excluded.length,
+                    'source': q.excluded.source,
+                },
+            )
+            insert_ignore_q = q.on_conflict_do_nothing(index_elements=index_elements)
+        elif dialect.name == 'mysql':
+            q = sa.dialects.mysql.insert(build_data_table)
+            upsert_q = q.on_duplicate_key_update(
+                value=q.inserted.value,
+                length=q.inserted.length,
+                source=q.inserted.source,
+            )
+            # assigning the id to itself is a no-op that, unlike INSERT IGNORE, does not hide
+            # other errors
+            insert_ignore_q = q.on_duplicate_key_update(id=build_data_table.c.id)
+        else:
+            return None
+
+        self._insert_stmts = {'upsert': upsert_q, 'insert_ignore': insert_ignore_q}
+        return self._insert_stmts
+
+    def _thd_skip_unchanged(self, conn, buildid, name, value, source):
+        # Large values are compared with the stored ones by the database so that identical data
+        # is not rewritten, which would otherwise produce a new row version and its journal
+        # entries. The value is only sent for the comparison when the stored length matches, so
+        # new and resized data cost a single cheap query. Returns True if nothing is left to write.
+        if len(value) < self._SKIP_UNCHANGED_MIN_LENGTH:
+            return False
+
+        stmts = self._get_select_stmts()
+        params = {'buildid': buildid, 'name': name}
+        with closing(conn.execute(stmts['no_value'], params)) as res:
+            row = res.fetchone()
+        if row is None or row.length != len(value):
+            return False
+
+        with closing(conn.execute(stmts['same_value'], {**params, 'value': value})) as res:
+            if res.fetchone() is None:
+                return False
+
+        if row.source != source:
+            build_data_table = self.db.model.build_data
+            q = build_data_table.update()
+            q = q.where(
+                (build_data_table.c.buildid == buildid) & (build_data_table.c.name == name)
+            )
+            conn.execute(q.values(source=source)).close()
+        return True
+
     @defer.inlineCallbacks
     def setBuildData(self, buildid, name, value, source):
+        update_values = {
+            'value': value,
+            'length': len(value),
+            'source': source,
+        }
+        insert_values = {**update_values, 'buildid': buildid, 'name': name}
+
         def thd(conn):
+            if self._thd_skip_unchanged(conn, buildid, name, value, source):
+                return
+
+            insert_stmts = self._get_insert_stmts(conn.dialect)
+            if insert_stmts is not None:
+                conn.execute(insert_stmts['upsert'], insert_values)
+                return
+
             build_data_table = self.db.model.build_data
 
-            update_values = {
-                'value': value,
-                'length': len(value),
-                'source': source,
-            }
+            update_q = build_data_table.update()
+            update_q = update_q.where(
+                (build_data_table.c.buildid == buildid) & (build_data_table.c.name == name)
+            )
+            update_q = update_q.values(update_values)
 
-            insert_values = {
-                'buildid': buildid,
-                'name': name,
-                'value': value,
-                'length': len(value),
-                'source': source,
-            }
+            insert_q = build_data_table.insert().values(insert_values)
 
             while True:
-                q = build_data_table.update()
-                q = q.where(
-                    (build_data_table.c.buildid == buildid) & (build_data_table.c.name == name)
-                )
-                q = q.values(update_values)
-                r = conn.execute(q)
+                r = conn.execute(update_q)
                 if r.rowcount > 0:
                     return
                 r.close()
@@ -96,25 +252,48 @@ class BuildDataConnectorComponent(base.DBConnectorComponent):
                 self._insert_race_hook(conn)
 
                 try:
-                    q = build_data_table.insert().values(insert_values)
-                    r = conn.execute(q)
+                    conn.execute(insert_q)
                     return
                 except (sa.exc.IntegrityError, sa.exc.ProgrammingError):
                     # there's been a competing insert, retry
                     pass
 
+        try:
+            yield self.db.pool.do(thd)
+        finally:
+            self._no_value_cache_generation += 1
+            self._no_value_cache.pop((buildid, name), None)
+
+    @defer.inlineCallbacks
+    def setBuildDataIfAbsent(self, buildid, name, value, source):
+        insert_values = {
+            'buildid': buildid,
+            'name': name,
+            'value': value,
+            'length': len(value),
+            'source': source,
+        }
+
+        def thd(conn):
+            insert_stmts = self._get_insert_stmts(conn.dialect)
+            if insert_stmts is not None:
+                conn.execute(insert_stmts['insert_ignore'], insert_values)
+                return
+
+            try:
+                conn.execute(self.db.model.build_data.insert().values(insert_values))
+            except (sa.exc.IntegrityError, sa.exc.ProgrammingError):
+                # the data already exists
+                pass
+
         yield self.db.pool.do(thd)
 
     @defer.inlineCallbacks
     def getBuildData(self, buildid, name):
         def thd(conn) -> BuildDataModel | None:
-            build_data_table = self.db.model.build_data
-
-            q = build_data_table.select().where(
-                (build_data_table.c.buildid == buildid) & (build_data_table.c.name == name)
-            )
-            res = conn.execute(q)
-            row = res.fetchone()
+            q = self._get_select_stmts()['with_value']
+            with closing(conn.execute(q, {'buildid': buildid, 'name': name})) as res:
+                row = res.fetchone()
             if not row:
                 return None
             return self._model_from_row(row, value=row.value)
@@ -124,39 +303,86 @@ class BuildDataConnectorComponent(base.DBConnectorComponent):
 
     @defer.inlineCallbacks
     def getBuildDataNoValue(self, buildid, name):
-        def thd(conn) -> BuildDataModel | None:
-            build_data_table = self.db.model.build_data
+        key = (buildid, name)
+        cache_size = self._no_value_cache_size()
+        cached = self._no_value_cache.get(key) if cache_size else None
+        if cached is not None:
+            self._no_value_cache.move_to_end(key)
+            return cached
 
-            q = sa.select(
-                build_data_table.c.buildid,
-                build_data_table.c.name,
-                build_data_table.c.length,
-                build_data_table.c.source,
-            )
-            q = q.where((build_data_table.c.buildid == buildid) & (build_data_table.c.name == name))
-            res = conn.execute(q)
-            row = res.fetchone()
+        def thd(conn) -> BuildDataModel | None:
+            q = self._get_select_stmts()['no_value']
+            with closing(conn.execute(q, {'buildid': buildid, 'name': name})) as res:
+                row = res.fetchone()
             if not row:
                 return None
             return self._model_from_row(row, value=None)
 
+        generation = self._no_value_cache_generation
         res = yield self.db.pool.do(thd)
+        if cache_size and res is not None and generation == self._no_value_cache_generation:
+            self._no_value_cache[key] = res
+            while len(self._no_value_cache) > cache_size:
+                self._no_value_cache.popitem(last=False)
         return res
 
     @defer.inlineCallbacks
     def getAllBuildDataNoValues(self, buildid):
         def thd(conn) -> list[BuildDataModel]:
-            build_data_table = self.db.model.build_data
+            q = self._get_select_stmts()['all_no_values']
 
-            q = sa.select(
-                build_data_table.c.buildid,
-                build_data_table.c.name,
-                build_data_table.c.length,
-                build_data_table.c.source,
+            # use a server-side cursor where available so that the rows are not all buffered
+            # before being converted to models
+            conn = conn.execution_options(
+                stream_results=True, max_row_buffer=self._FETCH_BATCH_SIZE
             )
-            q = q.where(build_data_table.c.buildid == buildid)
+            with closing(conn.execute(q, {'buildid': buildid})) as res:
+                return [self._model_from_row(row, value=None) for row in res]
 
-            return [self._model_from_row(row, value=None) for row in conn.execute(q).fetchall()]
+        res = yield self.db.pool.do(thd)
+        return res
+
+    @defer.inlineCallbacks
+    def getBuildDataBulk(self, pairs):
+        def thd(conn) -> dict[tuple[int, str], BuildDataModel]:
+            build_data_table = self.db.model.build_data
+
+            ret = {}
+            # row-value IN is not portable, so the pairs are matched with one condition each.
+            # Batching keeps the statements and their parameter lists small.
+            for batch in self.doBatch(set(pairs), 100):
+                q = build_data_table.select().where(
+                    sa.or_(*(
+                        (build_data_table.c.buildid == buildid) & (build_data_table.c.name == name)
+                        for buildid, name in batch
+                    ))
+                )
+                with closing(conn.execute(q)) as res:
+                    for row in res:
+                        ret[(row.buildid, row.name)] = self._model_from_row(row, value=row.value)
+            return ret
+
+        res = yield self.db.pool.do(thd)
+        return res
+
+    @defer.inlineCallbacks
+    def getAllBuildDataNoValuesForBuilds(self, buildids):
+        def thd(conn) -> dict[int, list[BuildDataModel]]:
+            build_data_table = self.db.model.build_data
+
+            ret = {buildid: [] for buildid in buildids}
+            for batch in self.doBatch(ret, 100):
+                q = sa.select(
+                    build_data_table.c.buildid,
+                    build_data_table.c.name,
+                    build_data_table.c.length,
+                    build_data_table.c.source,
+                )
+                q = q.where(build_data_table.c.buildid.in_(batch))
+                with closing(conn.execute(q)) as res:
+                    for row in res:
+                        ret[row.buildid].append(self._model_from_row(row, value=None))
+            return ret
 
         res = yield self.db.pool.do(thd)
         return res
@@ -166,38 +392,53 @@ class BuildDataConnectorComponent(base.DBConnectorComponent):
         build_data = self.db.model.build_data
         builds = self.db.model.builds
 
-        def count_build_datum(conn):
-            res = conn.execute(sa.select(sa.func.count(build_data.c.id)))
-            count = res.fetchone()[0]
-            res.close()
-            return count
-
         def thd(conn):
-            count_before = count_build_datum(conn)
-
-            if self.db._engine.dialect.name == 'sqlite':
-                # sqlite does not support delete with a join, so for this case we use a subquery,
-                # which is much slower
-
-                q = sa.select(builds.c.id)
-                q = q.where(
-                    (builds.c.complete_at >= older_than_timestamp) | (builds.c.complete_at == NULL)
-                )
+            if self._is_sqlite():
+                # sqlite does not support delete with a join, so for this case we use a
+                # correlated subquery. NOT EXISTS lets sqlite look up each build by its primary key
+                # instead of materializing the list of builds to keep as NOT IN would.
 
-                q = build_data.delete().where(build_data.c.buildid.notin_(q))
-            else:
-                q = build_data.delete()
+                q = sa.select(sa.literal(1))
                 q = q.where(builds.c.id == build_data.c.buildid)
                 q = q.where(
                     (builds.c.complete_at >= older_than_timestamp) | (builds.c.complete_at == NULL)
                 )
-            res = conn.execute(q)
-            res.close()
+                q = q.correlate(build_data)
 
-            count_after = count_build_datum(conn)
-            return count_before - count_after
+                q = build_data.delete().where(~sa.exists(q))
+                with closing(conn.execute(q)) as res:
+                    return res.rowcount
 
-        res = yield self.db.pool.do(thd)
+            # delete in bounded batches so that each statement holds its locks for a short time.
+            # The ids are selected first, as MySQL does not support LIMIT in IN subqueries.
+            select_q = sa.select(build_data.c.id)
+            select_q = select_q.select_from(
+                build_data.join(builds, builds.c.id == build_data.c.buildid)
+            )
+            select_q = select_q.where(builds.c.complete_at < older_than_timestamp)
+            select_q = select_q.limit(self._DELETE_BATCH_SIZE)
+
+            count = 0
+            while True:
+                with closing(conn.execute(select_q)) as res:
+                    ids = [row.id for row in res]
+                if not ids:
+                    break
+
+                delete_q = build_data.delete().where(build_data.c.id.in_(ids))
+                with closing(conn.execute(delete_q)) as res:
+                    count += res.rowcount
+
+                if len(ids) < self._DELETE_BATCH_SIZE:
+                    break
+            return count
+
+        try:
+            res = yield self.db.pool.do(thd)
+        finally:
+            # the deleted keys are not known, so drop everything
+            self._no_value_cache_generation += 1
+            self._no_value_cache.clear()
         return res
 
     def _model_from_row(self, row, value: bytes | None):
@@ -21,6 +21,7 @@ from twisted.internet import defer
 from twisted.python import log
 
 from buildbot import util
+from buildbot.config.master import DB_POOL_KEYS
 from buildbot.db import build_data
 from buildbot.db import builders
 from buildbot.db import buildrequests
@@ -118,7 +119,12 @@ class DBConnector(service.ReconfigurableServiceMixin, service.AsyncMultiService)
         log.msg(f"Setting up database with URL {repr(util.stripUrlPassword(db_url))}")
 
         # set up the engine and pool
-        self._engine = enginestrategy.create_engine(db_url, basedir=self.basedir)
+        engine_kwargs = {
+            key: value for key, value in self.master.config.db.items() if key in DB_POOL_KEYS
+        }
+        self._engine = enginestrategy.create_engine(
+            db_url, basedir=self.basedir, **engine_kwargs
+        )
         self.pool = pool.DBThreadPool(self._engine, reactor=self.master.reactor, verbose=verbose)
 
         # make sure the db is up to date, unless specifically asked not to
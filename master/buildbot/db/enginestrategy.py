@@ -128,12 +128,23 @@ def sa_url_set_attr(u, attr, value):
     return u
 
 
+# pool settings which are not supported by the pools used for sqlite
+SQLITE_IGNORED_POOL_KWARGS = ('pool_size', 'max_overflow', 'pool_pre_ping', 'pool_recycle')
+
+
 def special_case_sqlite(u, kwargs):
     """For sqlite, percent-substitute %(basedir)s and use a full
     path to the basedir.  If using a memory database, force the
-    pool size to be 1."""
+    pool size to be 1.  Connection pool settings are ignored, as
+    sqlite uses a single connection at a time."""
     max_conns = 1
 
+    pool_keys = sorted(k for k in SQLITE_IGNORED_POOL_KWARGS if k in kwargs)
+    if pool_keys:
+        log.msg(f"ignoring database pool settings for sqlite: {', '.join(pool_keys)}")
+        for key in pool_keys:
+            kwargs.pop(key)
+
     # when given a database path, stick the basedir in there
     if u.database:
         # Use NullPool instead of the sqlalchemy-0.6.8-default
@@ -176,7 +187,8 @@ def special_case_mysql(u, kwargs):
     anything else."""
     query = dict(u.query)
 
-    kwargs['pool_recycle'] = int(query.pop('max_idle', 3600))
+    max_idle = int(query.pop('max_idle', 3600))
+    kwargs.setdefault('pool_recycle', max_idle)
 
     # default to the MyISAM storage engine
     storage_engine = query.pop('storage_engine', 'MyISAM')
@@ -224,10 +236,13 @@ def create_engine(name_or_url, **kwargs):
     # remove the basedir as it may confuse sqlalchemy
     kwargs.pop('basedir')
 
-    # calculate the maximum number of connections from the pool parameters,
-    # if it hasn't already been specified
+    # size the connection pool for a busy master, unless configured otherwise,
+    # and keep the thread pool no larger than the number of connections the
+    # pool may open so that threads do not serialize on connection checkout
     if max_conns is None:
-        max_conns = kwargs.get('pool_size', 5) + kwargs.get('max_overflow', 10)
+        kwargs.setdefault('pool_size', 20)
+        kwargs.setdefault('max_overflow', 30)
+        max_conns = kwargs['pool_size'] + kwargs['max_overflow']
     driver_strategy = get_drivers_strategy(u.drivername)
     engine = sa.create_engine(u, **kwargs)
     driver_strategy.set_up(u, engine)
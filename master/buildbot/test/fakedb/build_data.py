@@ -70,6 +70,12 @@ class FakeBuildDataComponent(FakeDBComponent):
             'source': source,
         }
 
+    def setBuildDataIfAbsent(self, buildid, name, value, source):
+        assert isinstance(value, bytes)
+        if self._get_build_data_row(buildid, name) is None:
+            self.setBuildData(buildid, name, value, source)
+        return defer.succeed(None)
+
     # returns a Deferred
     def getBuildData(self, buildid, name) -> defer.Deferred[BuildDataModel | None]:
         row = self._get_build_data_row(buildid, name)
@@ -94,6 +100,26 @@ class FakeBuildDataComponent(FakeDBComponent):
 
         return defer.succeed(ret)
 
+    # returns a Deferred
+    def getBuildDataBulk(self, pairs) -> defer.Deferred[dict[tuple[int, str], BuildDataModel]]:
+        pairs = set(pairs)
+        ret = {}
+        for row in self.build_data.values():
+            key = (row['buildid'], row['name'])
+            if key in pairs:
+                ret[key] = self._model_from_row(row, value=row.get('value'))
+        return defer.succeed(ret)
+
+    # returns a Deferred
+    def getAllBuildDataNoValuesForBuilds(
+        self, buildids
+    ) -> defer.Deferred[dict[int, list[BuildDataModel]]]:
+        ret = {buildid: [] for buildid in buildids}
+        for row in self.build_data.values():
+            if row['buildid'] in ret:
+                ret[row['buildid']].append(self._model_from_row(row, value=None))
+        return defer.succeed(ret)
+
     # returns a Deferred
     def deleteOldBuildData(self, older_than_timestamp):
         buildids_to_keep = []
@@ -79,11 +79,14 @@ class FakeBuildRequestsComponent(FakeDBComponent):
     def setUp(self):
         self.reqs = {}
         self.claims = {}
+        # buildsetid -> {brid: row}
+        self._by_buildset = {}
 
     def insert_test_data(self, rows):
         for row in rows:
             if isinstance(row, BuildRequest):
                 self.reqs[row.id] = row
+                self._by_buildset.setdefault(row.buildsetid, {})[row.id] = row
 
             if isinstance(row, BuildRequestClaim):
                 self.claims[row.brid] = row
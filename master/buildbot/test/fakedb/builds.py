@@ -72,24 +72,61 @@ class BuildProperty(Row):
 class FakeBuildsComponent(FakeDBComponent):
     def setUp(self):
         self.builds = {}
+        # secondary indexes over self.builds, so that lookups do not need to scan every build
+        self._by_builder_number = {}
+        self._by_builder = {}
+        self._by_buildrequest = {}
+        self._by_worker = {}
+        self._max_number_per_builder = {}
+        self._next_id = 100
+
+    def _add_build_row(self, row):
+        id = row['id']
+        old_row = self.builds.get(id)
+        if old_row is not None:
+            self._by_builder[old_row['builderid']].pop(id, None)
+            self._by_buildrequest[old_row['buildrequestid']].pop(id, None)
+            self._by_worker[old_row['workerid']].pop(id, None)
+            key = (old_row['builderid'], old_row['number'])
+            if self._by_builder_number.get(key) is old_row:
+                del self._by_builder_number[key]
+
+        self.builds[id] = row
+        self._by_builder_number.setdefault((row['builderid'], row['number']), row)
+        self._by_builder.setdefault(row['builderid'], {})[id] = row
+        self._by_buildrequest.setdefault(row['buildrequestid'], {})[id] = row
+        self._by_worker.setdefault(row['workerid'], {})[id] = row
+        self._max_number_per_builder[row['builderid']] = max(
+            self._max_number_per_builder.get(row['builderid'], 0), row['number']
+        )
 
     def insert_test_data(self, rows):
+        # builds must all be inserted before their properties, so split the rows in one pass
+        builds = []
+        properties = []
         for row in rows:
-            if isinstance(row, Build):
-                build = self.builds[row.id] = row.values.copy()
-                build['properties'] = {}
+            row_type = type(row)
+            if row_type is Build:
+                builds.append(row)
+            elif row_type is BuildProperty:
+                properties.append(row)
 
-        for row in rows:
-            if isinstance(row, BuildProperty):
-                assert row.buildid in self.builds
-                self.builds[row.buildid]['properties'][row.name] = (row.value, row.source)
+        for row in builds:
+            # rows may be shared between tests, so they must not be modified
+            self._add_build_row({**row.values, 'properties': {}})
+
+        for row in properties:
+            assert row.buildid in self.builds
+            self.builds[row.buildid]['properties'][row.name] = (row.value, row.source)
 
     # component methods
 
     def _newId(self):
-        id = 100
+        # ids below _next_id are known to be taken, so only explicitly inserted ids are skipped
+        id = self._next_id
         while id in self.builds:
             id += 1
+        self._next_id = id + 1
         return id
 
     def _model_from_row(self, row):
@@ -115,16 +152,31 @@ class FakeBuildsComponent(FakeDBComponent):
         return defer.succeed(self._model_from_row(row))
 
     def getBuildByNumber(self, builderid, number) -> defer.Deferred[BuildModel | None]:
-        for row in self.builds.values():
-            if row['builderid'] == builderid and row['number'] == number:
-                return defer.succeed(self._model_from_row(row))
-        return defer.succeed(None)
+        row = self._by_builder_number.get((builderid, number))
+        if row is None:
+            return defer.succeed(None)
+        return defer.succeed(self._model_from_row(row))
 
     def getBuilds(
         self, builderid=None, buildrequestid=None, workerid=None, complete=None, resultSpec=None
     ) -> defer.Deferred[list[BuildModel]]:
+        candidates = [
+            index.get(value, {})
+            for index, value in (
+                (self._by_builder, builderid),
+                (self._by_buildrequest, buildrequestid),
+                (self._by_worker, workerid),
+            )
+            if value is not None
+        ]
+        if candidates:
+            # iterate over the smallest matching index, the remaining ones are checked below
+            rows = min(candidates, key=len).values()
+        else:
+            rows = self.builds.values()
+
         ret = []
-        for row in self.builds.values():
+        for row in rows:
             if builderid is not None and row['builderid'] != builderid:
                 continue
             if buildrequestid is not None and row['buildrequestid'] != buildrequestid:
@@ -141,11 +193,8 @@ class FakeBuildsComponent(FakeDBComponent):
     def addBuild(self, builderid, buildrequestid, workerid, masterid, state_string):
         validation.verifyType(self.t, 'state_string', state_string, validation.StringValidator())
         id = self._newId()
-        number = (
-            max([0] + [r['number'] for r in self.builds.values() if r['builderid'] == builderid])
-            + 1
-        )
-        self.builds[id] = {
+        number = self._max_number_per_builder.get(builderid, 0) + 1
+        self._add_build_row({
             "id": id,
             "number": number,
             "buildrequestid": buildrequestid,
@@ -157,7 +206,7 @@ class FakeBuildsComponent(FakeDBComponent):
             "locks_duration_s": 0,
             "complete_at": None,
             "results": None,
-        }
+        })
         return defer.succeed((id, number))
 
     def setBuildStateString(self, buildid, state_string):
@@ -176,14 +225,16 @@ class FakeBuildsComponent(FakeDBComponent):
         return defer.succeed(None)
 
     def getBuildProperties(self, bid, resultSpec=None):
-        if bid in self.builds:
-            ret = [
-                {"name": k, "source": v[1], "value": v[0]}
-                for k, v in self.builds[bid]['properties'].items()
-            ]
+        if bid not in self.builds:
+            return defer.succeed({})
 
-        if resultSpec is not None:
-            ret = self.applyResultSpec(ret, resultSpec)
+        props = self.builds[bid]['properties']
+        if resultSpec is None:
+            # values are already stored as (value, source) tuples
+            return defer.succeed(dict(props))
+
+        ret = [{"name": k, "source": v[1], "value": v[0]} for k, v in props.items()]
+        ret = self.applyResultSpec(ret, resultSpec)
 
         ret = {v['name']: (v['value'], v['source']) for v in ret}
         return defer.succeed(ret)
@@ -196,20 +247,16 @@ class FakeBuildsComponent(FakeDBComponent):
     @defer.inlineCallbacks
     def getBuildsForChange(self, changeid):
         change = yield self.db.changes.getChange(changeid)
-        bsets = yield self.db.buildsets.getBuildsets()
         change_ssid = change['sourcestampid']
 
-        change_buildsetids = set(
-            bset.bsid for bset in bsets if any(change_ssid == ssid for ssid in bset.sourcestamps)
-        )
-
-        breqs = yield self.db.buildrequests.getBuildRequests()
-        change_breqids = [
-            breq.buildrequestid for breq in breqs if breq.buildsetid in change_buildsetids
-        ]
-
-        builds = yield self.db.builds.getBuilds()
-        return [build for build in builds if build.buildrequestid in change_breqids]
+        # follow the indexes of the other components, like the single join done by the real
+        # connector, instead of scanning all buildsets, buildrequests and builds
+        ret = []
+        for bsid in self.db.buildsets._by_sourcestamp.get(change_ssid, ()):
+            for brid in self.db.buildrequests._by_buildset.get(bsid, {}):
+                for row in self._by_buildrequest.get(brid, {}).values():
+                    ret.append(self._model_from_row(row))
+        return ret
 
     def add_build_locks_duration(self, buildid, duration_s):
         b = self.builds.get(buildid)
@@ -95,6 +95,8 @@ class FakeBuildsetsComponent(FakeDBComponent):
         self.buildsets = {}
         self.completed_bsids = set()
         self.buildset_sourcestamps = {}
+        # sourcestampid -> set of buildset ids, so that buildsets of a change can be found quickly
+        self._by_sourcestamp = {}
 
     def insert_test_data(self, rows):
         for row in rows:
@@ -113,6 +115,7 @@ class FakeBuildsetsComponent(FakeDBComponent):
             if isinstance(row, BuildsetSourceStamp):
                 assert row.buildsetid in self.buildsets
                 self.buildset_sourcestamps.setdefault(row.buildsetid, []).append(row.sourcestampid)
+                self._by_sourcestamp.setdefault(row.sourcestampid, set()).add(row.buildsetid)
 
     # component methods
 
@@ -181,6 +184,8 @@ class FakeBuildsetsComponent(FakeDBComponent):
                 ss = yield self.db.sourcestamps.findSourceStampId(**ss)
             ssids.append(ss)
         self.buildset_sourcestamps[bsid] = ssids
+        for ssid in ssids:
+            self._by_sourcestamp.setdefault(ssid, set()).add(bsid)
 
         return (bsid, {br.builderid: br.id for br in br_rows})
 
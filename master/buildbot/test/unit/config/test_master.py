@@ -249,7 +249,7 @@ class MasterConfigTests(ConfigErrorsMixin, dirs.DirsMixin, unittest.TestCase):
             "db": {"db_url": 'sqlite:///state.sqlite'},
             "mq": {"type": 'simple'},
             "metrics": None,
-            "caches": {"Changes": 10, "Builds": 15},
+            "caches": {"Changes": 10, "Builds": 15, "build_data": 1000},
             "schedulers": {},
             "builders": [],
             "workers": [],
@@ -586,6 +586,47 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
         self.cfg.load_db(self.filename, {'db': {'db_url': 'abcd'}})
         self.assertResults(db={"db_url": 'abcd'})
 
+    def test_load_db_pool_params(self):
+        self.cfg.load_db(
+            self.filename,
+            {
+                'db': {
+                    'db_url': 'abcd',
+                    'pool_size': 10,
+                    'max_overflow': 0,
+                    'pool_pre_ping': False,
+                    'pool_recycle': 300,
+                }
+            },
+        )
+        self.assertResults(
+            db={
+                "db_url": 'abcd',
+                "pool_size": 10,
+                "max_overflow": 0,
+                "pool_pre_ping": False,
+                "pool_recycle": 300,
+            }
+        )
+
+    def test_load_db_pool_size_bad_type(self):
+        with capture_config_errors() as errors:
+            self.cfg.load_db(self.filename, {'db': {'db_url': 'abcd', 'pool_size': '10'}})
+
+        self.assertConfigError(errors, "c['db']['pool_size'] must be an integer")
+
+    def test_load_db_pool_pre_ping_bad_type(self):
+        with capture_config_errors() as errors:
+            self.cfg.load_db(self.filename, {'db': {'db_url': 'abcd', 'pool_pre_ping': 1}})
+
+        self.assertConfigError(errors, "c['db']['pool_pre_ping'] must be a boolean")
+
+    def test_load_db_pool_size_zero(self):
+        with capture_config_errors() as errors:
+            self.cfg.load_db(self.filename, {'db': {'db_url': 'abcd', 'pool_size': 0}})
+
+        self.assertConfigError(errors, "c['db']['pool_size'] must be at least 1")
+
     def test_load_db_unk_keys(self):
         with capture_config_errors() as errors:
             self.cfg.load_db(self.filename, {'db': {'db_url': 'abcd', 'bar': 'bar'}})
@@ -628,7 +669,7 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
 
     def test_load_caches_defaults(self):
         self.cfg.load_caches(self.filename, {})
-        self.assertResults(caches={"Changes": 10, "Builds": 15})
+        self.assertResults(caches={"Changes": 10, "Builds": 15, "build_data": 1000})
 
     def test_load_caches_invalid(self):
         with capture_config_errors() as errors:
@@ -638,7 +679,7 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
 
     def test_load_caches_buildCacheSize(self):
         self.cfg.load_caches(self.filename, {"buildCacheSize": 13})
-        self.assertResults(caches={"Builds": 13, "Changes": 10})
+        self.assertResults(caches={"Builds": 13, "Changes": 10, "build_data": 1000})
 
     def test_load_caches_buildCacheSize_and_caches(self):
         with capture_config_errors() as errors:
@@ -648,7 +689,7 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
 
     def test_load_caches_changeCacheSize(self):
         self.cfg.load_caches(self.filename, {"changeCacheSize": 13})
-        self.assertResults(caches={"Changes": 13, "Builds": 15})
+        self.assertResults(caches={"Changes": 13, "Builds": 15, "build_data": 1000})
 
     def test_load_caches_changeCacheSize_and_caches(self):
         with capture_config_errors() as errors:
@@ -658,7 +699,7 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
 
     def test_load_caches(self):
         self.cfg.load_caches(self.filename, {"caches": {"foo": 1}})
-        self.assertResults(caches={"Changes": 10, "Builds": 15, "foo": 1})
+        self.assertResults(caches={"Changes": 10, "Builds": 15, "build_data": 1000, "foo": 1})
 
     def test_load_caches_not_int_err(self):
         """
@@ -13,6 +13,12 @@
 #
 # Copyright Buildbot Team Members
 
+import copy
+import pickle
+
+import sqlalchemy as sa
+import sqlalchemy.dialects.mysql
+import sqlalchemy.dialects.postgresql
 from parameterized import parameterized
 from twisted.internet import defer
 from twisted.trial import unittest
@@ -21,6 +27,8 @@ from buildbot.db import build_data
 from buildbot.test import fakedb
 from buildbot.test.util import connector_component
 from buildbot.test.util import interfaces
+from buildbot.test.util.warnings import assertProducesWarnings
+from buildbot.warnings import DeprecatedApiWarning
 
 
 class Tests(interfaces.InterfaceTests):
@@ -43,6 +51,11 @@ class Tests(interfaces.InterfaceTests):
         def setBuildData(self, buildid, name, value, source):
             pass
 
+    def test_signature_add_build_data_if_absent(self):
+        @self.assertArgSpecMatches(self.db.build_data.setBuildDataIfAbsent)
+        def setBuildDataIfAbsent(self, buildid, name, value, source):
+            pass
+
     def test_signature_get_build_data(self):
         @self.assertArgSpecMatches(self.db.build_data.getBuildData)
         def getBuildData(self, buildid, name):
@@ -58,6 +71,16 @@ class Tests(interfaces.InterfaceTests):
         def getAllBuildDataNoValues(self, buildid):
             pass
 
+    def test_signature_get_build_data_bulk(self):
+        @self.assertArgSpecMatches(self.db.build_data.getBuildDataBulk)
+        def getBuildDataBulk(self, pairs):
+            pass
+
+    def test_signature_get_all_build_data_no_values_for_builds(self):
+        @self.assertArgSpecMatches(self.db.build_data.getAllBuildDataNoValuesForBuilds)
+        def getAllBuildDataNoValuesForBuilds(self, buildids):
+            pass
+
     @defer.inlineCallbacks
     def test_add_data_get_data(self):
         yield self.insert_test_data(self.common_data)
@@ -106,6 +129,52 @@ class Tests(interfaces.InterfaceTests):
             ),
         )
 
+    @defer.inlineCallbacks
+    def test_add_data_replace_large_value(self):
+        yield self.insert_test_data(self.common_data)
+        value = b'a' * 100000
+        yield self.db.build_data.setBuildData(
+            buildid=30, name='mykey', value=value, source='mysource'
+        )
+
+        # same value, different source
+        yield self.db.build_data.setBuildData(
+            buildid=30, name='mykey', value=value, source='mysource2'
+        )
+        data_dict = yield self.db.build_data.getBuildData(buildid=30, name='mykey')
+        self.assertEqual(
+            data_dict,
+            build_data.BuildDataModel(
+                buildid=30, name='mykey', value=value, length=100000, source='mysource2'
+            ),
+        )
+
+        # different value of the same length
+        value2 = b'b' * 100000
+        yield self.db.build_data.setBuildData(
+            buildid=30, name='mykey', value=value2, source='mysource2'
+        )
+        data_dict = yield self.db.build_data.getBuildData(buildid=30, name='mykey')
+        self.assertEqual(data_dict.value, value2)
+
+    @defer.inlineCallbacks
+    def test_add_data_if_absent(self):
+        yield self.insert_test_data(self.common_data)
+        yield self.db.build_data.setBuildDataIfAbsent(
+            buildid=30, name='mykey', value=b'myvalue', source='mysource'
+        )
+        yield self.db.build_data.setBuildDataIfAbsent(
+            buildid=30, name='mykey', value=b'myvalue2', source='mysource2'
+        )
+
+        data_dict = yield self.db.build_data.getBuildData(buildid=30, name='mykey')
+        self.assertEqual(
+            data_dict,
+            build_data.BuildDataModel(
+                buildid=30, name='mykey', value=b'myvalue', length=7, source='mysource'
+            ),
+        )
+
     @defer.inlineCallbacks
     def test_add_data_insert_race(self):
         yield self.insert_test_data(self.common_data)
@@ -122,7 +191,7 @@ class Tests(interfaces.InterfaceTests):
             q = self.db.model.build_data.insert().values(insert_values)
             conn.execute(q)
 
-        self.db.build_data._test_timing_hook = hook
+        self.db.build_data._insert_race_hook = hook
 
         yield self.db.build_data.setBuildData(
             buildid=30, name='mykey', value=b'myvalue', source='mysource'
@@ -156,6 +225,26 @@ class Tests(interfaces.InterfaceTests):
             ),
         )
 
+    @defer.inlineCallbacks
+    def test_add_data_replace_value_get_data_no_value(self):
+        yield self.insert_test_data(self.common_data)
+        yield self.db.build_data.setBuildData(
+            buildid=30, name='mykey', value=b'myvalue', source='mysource'
+        )
+        data_dict = yield self.db.build_data.getBuildDataNoValue(buildid=30, name='mykey')
+        self.assertEqual(data_dict.length, 7)
+
+        yield self.db.build_data.setBuildData(
+            buildid=30, name='mykey', value=b'myvalue2', source='mysource2'
+        )
+        data_dict = yield self.db.build_data.getBuildDataNoValue(buildid=30, name='mykey')
+        self.assertEqual(
+            data_dict,
+            build_data.BuildDataModel(
+                buildid=30, name='mykey', value=None, length=8, source='mysource2'
+            ),
+        )
+
     @defer.inlineCallbacks
     def test_get_data_no_values_non_existing(self):
         yield self.insert_test_data(self.common_data)
@@ -197,6 +286,77 @@ class Tests(interfaces.InterfaceTests):
         data_dicts = yield self.db.build_data.getAllBuildDataNoValues(32)
         self.assertEqual([d.name for d in data_dicts], [])
 
+    @defer.inlineCallbacks
+    def test_get_build_data_bulk(self):
+        yield self.insert_test_data(
+            self.common_data
+            + [
+                fakedb.BuildData(
+                    id=91, buildid=30, name='name1', value=b'value1', source='source1'
+                ),
+                fakedb.BuildData(
+                    id=92, buildid=30, name='name2', value=b'value2', source='source2'
+                ),
+                fakedb.BuildData(
+                    id=93, buildid=31, name='name1', value=b'value3', source='source3'
+                ),
+            ]
+        )
+
+        data = yield self.db.build_data.getBuildDataBulk([
+            (30, 'name1'),
+            (31, 'name1'),
+            (31, 'name2'),
+            (40, 'name1'),
+        ])
+        self.assertEqual(
+            data,
+            {
+                (30, 'name1'): build_data.BuildDataModel(
+                    buildid=30, name='name1', value=b'value1', length=6, source='source1'
+                ),
+                (31, 'name1'): build_data.BuildDataModel(
+                    buildid=31, name='name1', value=b'value3', length=6, source='source3'
+                ),
+            },
+        )
+
+        data = yield self.db.build_data.getBuildDataBulk([])
+        self.assertEqual(data, {})
+
+    @defer.inlineCallbacks
+    def test_get_all_build_data_no_values_for_builds(self):
+        yield self.insert_test_data(
+            self.common_data
+            + [
+                fakedb.BuildData(
+                    id=91, buildid=30, name='name1', value=b'value1', source='source1'
+                ),
+                fakedb.BuildData(
+                    id=92, buildid=30, name='name2', value=b'value2', source='source2'
+                ),
+                fakedb.BuildData(
+                    id=93, buildid=31, name='name3', value=b'value3', source='source3'
+                ),
+            ]
+        )
+
+        data = yield self.db.build_data.getAllBuildDataNoValuesForBuilds([30, 40])
+        self.assertEqual(
+            data,
+            {
+                30: [
+                    build_data.BuildDataModel(
+                        buildid=30, name='name1', value=None, length=6, source='source1'
+                    ),
+                    build_data.BuildDataModel(
+                        buildid=30, name='name2', value=None, length=6, source='source2'
+                    ),
+                ],
+                40: [],
+            },
+        )
+
     @parameterized.expand([
         (1000000, 0, ['name1', 'name2', 'name3', 'name4', 'name5', 'name6']),
         (1000001, 0, ['name1', 'name2', 'name3', 'name4', 'name5', 'name6']),
@@ -257,9 +417,16 @@ class Tests(interfaces.InterfaceTests):
             ]
         )
 
+        # load data into any cache, which must not return deleted data afterwards
+        data_dict = yield self.db.build_data.getBuildDataNoValue(buildid=51, name='name3')
+        self.assertIsNotNone(data_dict)
+
         num_deleted = yield self.db.build_data.deleteOldBuildData(older_than_timestamp)
         self.assertEqual(num_deleted, exp_num_deleted)
 
+        data_dict = yield self.db.build_data.getBuildDataNoValue(buildid=51, name='name3')
+        self.assertEqual(data_dict is not None, 'name3' in exp_remaining_names)
+
         remaining_names = []
         for buildid in [50, 51, 52, 53]:
             data_dicts = yield self.db.build_data.getAllBuildDataNoValues(buildid)
@@ -268,6 +435,35 @@ class Tests(interfaces.InterfaceTests):
         self.assertEqual(sorted(remaining_names), sorted(exp_remaining_names))
 
 
+class TestBuildDataModel(unittest.TestCase):
+    @parameterized.expand([
+        ('copy', copy.copy),
+        ('deepcopy', copy.deepcopy),
+        ('pickle', lambda model: pickle.loads(pickle.dumps(model))),
+    ])
+    def test_copy(self, name, copy_fn):
+        model = build_data.BuildDataModel(
+            buildid=30, name='mykey', value=b'myvalue', length=7, source='mysource'
+        )
+        copied = copy_fn(model)
+        self.assertEqual(copied, model)
+        self.assertIsInstance(copied, build_data.BuildDataModel)
+
+    def test_getitem_warns_once(self):
+        self.patch(build_data.BuildDataModel, '_deprecation_warned', False)
+        model = build_data.BuildDataModel(
+            buildid=30, name='mykey', value=b'myvalue', length=7, source='mysource'
+        )
+
+        with assertProducesWarnings(
+            DeprecatedApiWarning, message_pattern=r'Usage of \[\] accessor is deprecated'
+        ):
+            self.assertEqual(model['name'], 'mykey')
+            self.assertEqual(model['length'], 7)
+            with self.assertRaises(KeyError):
+                model['missing']
+
+
 class TestFakeDB(Tests, connector_component.FakeConnectorComponentMixin, unittest.TestCase):
     @defer.inlineCallbacks
     def setUp(self):
@@ -294,3 +490,198 @@ class TestRealDB(unittest.TestCase, connector_component.ConnectorComponentMixin,
 
     def tearDown(self):
         return self.tearDownConnectorComponent()
+
+    @parameterized.expand([
+        (
+            'postgresql',
+            'ON CONFLICT (buildid, name) DO UPDATE',
+            'ON CONFLICT (buildid, name) DO NOTHING',
+        ),
+        ('mysql', 'ON DUPLICATE KEY UPDATE value', 'ON DUPLICATE KEY UPDATE id'),
+    ])
+    def test_insert_stmts_dialect(self, dialect_name, upsert_sql, insert_ignore_sql):
+        dialect = getattr(sa.dialects, dialect_name).dialect()
+        # a new component, as the statements are cached for the dialect of the test database
+        component = build_data.BuildDataConnectorComponent(self.db)
+        stmts = component._get_insert_stmts(dialect)
+        self.assertIn(upsert_sql, str(stmts['upsert'].compile(dialect=dialect)))
+        self.assertIn(insert_ignore_sql, str(stmts['insert_ignore'].compile(dialect=dialect)))
+
+    def record_fetched_rows(self):
+        # returns a list of all rows fetched from the database by the component
+        rows = []
+        orig_do = self.db.pool.do
+
+        def do(callable, *args, **kwargs):
+            def thd(conn, *args, **kwargs):
+                orig_execute = conn.execute
+
+                def execute(*args, **kwargs):
+                    frozen = orig_execute(*args, **kwargs).freeze()
+                    rows.extend(frozen.data)
+                    return frozen()
+
+                conn.execute = execute
+                try:
+                    return callable(conn, *args, **kwargs)
+                finally:
+                    del conn.execute
+
+            return orig_do(thd, *args, **kwargs)
+
+        self.patch(self.db.pool, 'do', do)
+        return rows
+
+    @defer.inlineCallbacks
+    def test_get_build_data_bulk_reads_requested_rows_only(self):
+        yield self.insert_test_data([
+            *self.common_data,
+            fakedb.BuildData(buildid=30, name='name1', value=b'value1', source='source1'),
+            fakedb.BuildData(buildid=30, name='name2', value=b'value2', source='source2'),
+            fakedb.BuildData(buildid=31, name='name1', value=b'value3', source='source3'),
+            fakedb.BuildData(buildid=31, name='name2', value=b'value4', source='source4'),
+        ])
+        rows = self.record_fetched_rows()
+
+        data = yield self.db.build_data.getBuildDataBulk([(30, 'name1'), (31, 'name2')])
+
+        self.assertEqual(sorted(data), [(30, 'name1'), (31, 'name2')])
+        self.assertEqual(sorted(row.value for row in rows), [b'value1', b'value4'])
+
+    def record_executed_statements(self):
+        # returns a list of the SQL statements executed by the component and their parameters
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        engine = self.db.pool.engine
+        sa.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        self.addCleanup(sa.event.remove, engine, 'before_cursor_execute', before_cursor_execute)
+        return statements
+
+    @parameterized.expand([
+        ('new', None),
+        ('resized', b'b' * 100000),
+    ])
+    @defer.inlineCallbacks
+    def test_add_data_large_value_not_compared(self, name, old_value):
+        yield self.insert_test_data(self.common_data)
+        if old_value is not None:
+            yield self.db.build_data.setBuildData(
+                buildid=30, name='mykey', value=old_value, source='mysource'
+            )
+        statements = self.record_executed_statements()
+
+        value = b'a' * 200000
+        yield self.db.build_data.setBuildData(
+            buildid=30, name='mykey', value=value, source='mysource'
+        )
+
+        # the value is only sent to be written, as the stored length differs
+        selects = [
+            parameters
+            for statement, parameters in statements
+            if statement.lstrip().upper().startswith('SELECT')
+        ]
+        self.assertTrue(selects)
+        for parameters in selects:
+            self.assertNotIn(value, list(parameters))
+
+        data_dict = yield self.db.build_data.getBuildData(buildid=30, name='mykey')
+        self.assertEqual(data_dict.value, value)
+
+    @defer.inlineCallbacks
+    def test_add_data_unchanged_large_value_not_written(self):
+        yield self.insert_test_data(self.common_data)
+        value = b'a' * 100000
+        yield self.db.build_data.setBuildData(
+            buildid=30, name='mykey', value=value, source='mysource'
+        )
+
+        def get_insert_stmts(dialect):
+            self.fail('unchanged value must not be written')
+
+        self.db.build_data._get_insert_stmts = get_insert_stmts
+        yield self.db.build_data.setBuildData(
+            buildid=30, name='mykey', value=value, source='mysource2'
+        )
+
+        data_dict = yield self.db.build_data.getBuildDataNoValue(buildid=30, name='mykey')
+        self.assertEqual(data_dict.source, 'mysource2')
+
+    @defer.inlineCallbacks
+    def test_no_value_cache(self):
+        yield self.insert_test_data([
+            *self.common_data,
+            fakedb.BuildData(buildid=30, name='name1', value=b'value1', source='source1'),
+            fakedb.BuildData(buildid=30, name='name2', value=b'value2', source='source2'),
+        ])
+        self.db.master.config.caches['build_data'] = 1
+
+        yield self.db.build_data.getBuildDataNoValue(buildid=30, name='name1')
+        yield self.db.build_data.getBuildDataNoValue(buildid=30, name='name2')
+
+        self.assertEqual(list(self.db.build_data._no_value_cache), [(30, 'name2')])
+
+
+class TestRealDBNoSqliteSpecialCase(TestRealDB):
+    # runs the code paths used for databases other than sqlite and without native upsert support
+    # against the test database
+
+    @defer.inlineCallbacks
+    def setUp(self):
+        yield super().setUp()
+        self.db.build_data._is_sqlite_cached = False
+        self.db.build_data._DELETE_BATCH_SIZE = 2
+        self.db.build_data._get_insert_stmts = lambda dialect: None
+
+    @defer.inlineCallbacks
+    def test_no_value_cache(self):
+        # other masters may change the data, so nothing is cached
+        yield self.insert_test_data([
+            *self.common_data,
+            fakedb.BuildData(buildid=30, name='name1', value=b'value1', source='source1'),
+        ])
+        self.db.master.config.caches['build_data'] = 10
+
+        yield self.db.build_data.getBuildDataNoValue(buildid=30, name='name1')
+
+        def thd(conn):
+            build_data_table = self.db.model.build_data
+            conn.execute(build_data_table.update().values(source='source2'))
+
+        yield self.db.pool.do(thd)
+
+        data_dict = yield self.db.build_data.getBuildDataNoValue(buildid=30, name='name1')
+        self.assertEqual(data_dict.source, 'source2')
+        self.assertEqual(list(self.db.build_data._no_value_cache), [])
+
+    @defer.inlineCallbacks
+    def test_add_data_insert_race_retries_update(self):
+        yield self.insert_test_data(self.common_data)
+
+        hook_calls = []
+
+        def hook(conn):
+            hook_calls.append(conn)
+            value = b'myvalue_old'
+            q = self.db.model.build_data.insert().values(
+                buildid=30, name='mykey', value=value, length=len(value), source='mysource_old'
+            )
+            conn.execute(q)
+
+        self.db.build_data._insert_race_hook = hook
+
+        yield self.db.build_data.setBuildData(
+            buildid=30, name='mykey', value=b'myvalue', source='mysource'
+        )
+
+        self.assertEqual(len(hook_calls), 1)
+        data_dict = yield self.db.build_data.getBuildData(buildid=30, name='mykey')
+        self.assertEqual(
+            data_dict,
+            build_data.BuildDataModel(
+                buildid=30, name='mykey', value=b'myvalue', length=7, source='mysource'
+            ),
+        )
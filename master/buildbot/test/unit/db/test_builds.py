@@ -453,6 +453,12 @@ class Tests(interfaces.InterfaceTests):
             props = yield self.db.builds.getBuildProperties(buildid)
             self.assertEqual(0, len(props))
 
+    @defer.inlineCallbacks
+    def testgetBuildPropertiesNonexistentBuild(self):
+        yield self.insert_test_data(self.backgroundData + self.threeBuilds)
+        props = yield self.db.builds.getBuildProperties(99)
+        self.assertEqual(props, {})
+
     @defer.inlineCallbacks
     def test_testgetBuildProperties_resultSpecFilter(self):
         rs = resultspec.ResultSpec(filters=[resultspec.Filter('name', 'eq', ["prop", "prop2"])])
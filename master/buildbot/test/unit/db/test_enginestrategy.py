@@ -13,7 +13,11 @@
 #
 # Copyright Buildbot Team Members
 
+import os
+from unittest import mock
+
 import sqlalchemy as sa
+from parameterized import parameterized
 from sqlalchemy.engine import url
 from sqlalchemy.pool import NullPool
 from twisted.python import runtime
@@ -95,6 +99,21 @@ class BuildbotCreateEngineTest(unittest.TestCase):
             ],
         )
 
+    def test_sqlite_pool_settings_ignored(self):
+        u = url.make_url("sqlite:////x/state.sqlite")
+        kwargs = {
+            "basedir": '/my-base-dir',
+            "pool_size": 5,
+            "max_overflow": 10,
+            "pool_pre_ping": True,
+            "pool_recycle": 300,
+        }
+        u, kwargs, max_conns = enginestrategy.special_case_sqlite(u, kwargs)
+        self.assertEqual(
+            [str(u), max_conns, self.filter_kwargs(kwargs)],
+            ["sqlite:////x/state.sqlite", 1, self.sqlite_kwargs],
+        )
+
     def test_mysql_simple(self):
         u = url.make_url("mysql://host/dbname")
         kwargs = {"basedir": 'my-base-dir'}
@@ -146,6 +165,17 @@ class BuildbotCreateEngineTest(unittest.TestCase):
             ["mysql:///dbname?charset=utf8&use_unicode=True", None, exp],
         )
 
+    def test_mysql_max_idle_configured_pool_recycle(self):
+        u = url.make_url("mysql:///dbname?max_idle=1234")
+        kwargs = {"basedir": 'my-base-dir', "pool_recycle": 300}
+        u, kwargs, max_conns = enginestrategy.special_case_mysql(u, kwargs)
+        exp = self.mysql_kwargs.copy()
+        exp['pool_recycle'] = 300
+        self.assertEqual(
+            [str(u), max_conns, self.filter_kwargs(kwargs)],
+            ["mysql:///dbname?charset=utf8&use_unicode=True", None, exp],
+        )
+
     def test_mysql_good_charset(self):
         u = url.make_url("mysql:///dbname?charset=utf8")
         kwargs = {"basedir": 'my-base-dir'}
@@ -195,3 +225,50 @@ class BuildbotEngineStrategy(unittest.TestCase):
         engine = enginestrategy.create_engine('sqlite://', basedir="/base")
         with engine.connect() as conn:
             self.assertEqual(conn.scalar(sa.text("SELECT 13 + 14")), 27)
+
+    def test_create_engine_sqlite_file_pool_settings(self):
+        basedir = self.mktemp()
+        os.makedirs(basedir)
+        engine = enginestrategy.create_engine(
+            'sqlite:///state.sqlite', basedir=basedir, pool_size=5, max_overflow=10
+        )
+        self.addCleanup(engine.dispose)
+        with engine.connect() as conn:
+            self.assertEqual(conn.scalar(sa.text("SELECT 13 + 14")), 27)
+        self.assertEqual(engine.optimal_thread_pool_size, 1)
+
+    def create_engine_kwargs(self, name_or_url):
+        # returns the arguments passed to sqlalchemy, without connecting to the database
+        class Created(Exception):
+            pass
+
+        def create_engine(u, **kwargs):
+            raise Created(kwargs)
+
+        self.patch(sa, 'create_engine', create_engine)
+        with self.assertRaises(Created) as cm:
+            enginestrategy.create_engine(name_or_url, basedir='/base')
+        return cm.exception.args[0]
+
+    def test_create_engine_postgresql_pool_defaults(self):
+        kwargs = self.create_engine_kwargs('postgresql://host/dbname')
+        self.assertEqual(kwargs['pool_size'], 20)
+        self.assertEqual(kwargs['max_overflow'], 30)
+        # pinging costs a round trip for each database call, so it is opt-in
+        self.assertNotIn('pool_pre_ping', kwargs)
+
+    def test_create_engine_mysql_no_pool_pre_ping(self):
+        kwargs = self.create_engine_kwargs('mysql://host/dbname')
+        self.assertNotIn('pool_pre_ping', kwargs)
+
+    @parameterized.expand([
+        ('defaults', {}, 50),
+        ('configured', {'pool_size': 5, 'max_overflow': 2}, 7),
+    ])
+    def test_create_engine_thread_pool_size(self, name, pool_kwargs, expected):
+        self.patch(sa, 'create_engine', lambda u, **kwargs: mock.Mock())
+        engine = enginestrategy.create_engine(
+            'postgresql://host/dbname', basedir='/base', **pool_kwargs
+        )
+        # every thread may hold a connection, including the overflow ones
+        self.assertEqual(engine.optimal_thread_pool_size, expected)
@@ -0,0 +1,52 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import sqlalchemy as sa
+from twisted.trial import unittest
+
+from buildbot.util import sautils
+
+
+class InsertFromSelect(unittest.TestCase):
+    def setUp(self):
+        metadata = sa.MetaData()
+        self.src = sa.Table('src', metadata, sa.Column('x', sa.Integer))
+        self.dst = sa.Table('dst', metadata, sa.Column('x', sa.Integer))
+        self.engine = sa.create_engine('sqlite://')
+        metadata.create_all(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_cache_key_depends_on_table_and_select(self):
+        def key(table, select):
+            return sautils.InsertFromSelect(table, select)._generate_cache_key()
+
+        select = sa.select(self.src.c.x)
+        self.assertEqual(key(self.dst, select), key(self.dst, sa.select(self.src.c.x)))
+        self.assertNotEqual(key(self.dst, select), key(self.src, select))
+        self.assertNotEqual(key(self.dst, select), key(self.dst, select.where(self.src.c.x > 1)))
+
+    def test_execute(self):
+        with self.engine.begin() as conn:
+            conn.execute(self.src.insert(), [{'x': 1}, {'x': 2}, {'x': 3}])
+            for threshold in (2, 1):
+                conn.execute(
+                    sautils.InsertFromSelect(
+                        self.dst, sa.select(self.src.c.x).where(self.src.c.x > threshold)
+                    )
+                )
+            res = conn.execute(sa.select(self.dst.c.x).order_by(self.dst.c.x))
+            self.assertEqual([row.x for row in res], [2, 3, 3])
@@ -22,6 +22,7 @@ import sqlalchemy as sa
 from sqlalchemy.ext import compiler
 from sqlalchemy.sql.expression import ClauseElement
 from sqlalchemy.sql.expression import Executable
+from sqlalchemy.sql.visitors import InternalTraversal
 
 if TYPE_CHECKING:
     from sqlalchemy.engine.base import Connection
@@ -36,6 +37,14 @@ if TYPE_CHECKING:
 class InsertFromSelect(Executable, ClauseElement):
     _execution_options = Executable._execution_options.union({'autocommit': True})
 
+    # let SQLAlchemy cache the compiled statement; the cache key covers both the table and the
+    # select so that different statements are never confused
+    inherit_cache = True
+    _traverse_internals = [
+        ('table', InternalTraversal.dp_clauseelement),
+        ('select', InternalTraversal.dp_clauseelement),
+    ]
+
     def __init__(self, table, select):
         self.table = table
         self.select = select
@@ -0,0 +1 @@
+Added ``getBuildDataBulk`` and ``getAllBuildDataNoValuesForBuilds`` to ``BuildDataConnectorComponent`` to fetch build data of several builds in a single query.
@@ -0,0 +1 @@
+With SQLite databases, ``getBuildDataNoValue`` results are now cached in memory; the cache size is set by the ``build_data`` entry of :bb:cfg:`caches` and defaults to 1000.
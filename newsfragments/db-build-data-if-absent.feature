@@ -0,0 +1 @@
+Added ``setBuildDataIfAbsent`` to ``BuildDataConnectorComponent`` to add build data only if it does not exist yet.
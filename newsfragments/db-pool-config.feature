@@ -0,0 +1,2 @@
+The database connection pool can now be sized with the ``pool_size``, ``max_overflow``, ``pool_pre_ping`` and ``pool_recycle`` keys of ``c['db']``.
+MySQL and Postgres connection pools now default to 20 connections with up to 30 overflow connections, which are all used by the database thread pool.